@@ -0,0 +1,69 @@
+"""
+Зависимости FastAPI для аутентификации, общие для всех маршрутов.
+"""
+
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
+from supabase import AsyncClient, AuthApiError
+
+from auth.supabase_auth import decode_claims_unverified, token_cache_key, verify_supabase_jwt
+from db.supabase_client import get_supabase
+
+security = HTTPBearer()  # Используется для извлечения токена из заголовка Authorization
+
+# Короткий кэш ответов supabase.auth.get_user для токенов, которые нельзя проверить локально:
+# token_cache_key(token) -> (user, expires_at), где expires_at = min(exp, сейчас + USER_CACHE_TTL)
+USER_CACHE_TTL = 5
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+
+# Текущий пользователь, восстановленный из проверенного токена
+class CurrentUser(BaseModel):
+    id: str
+    email: Optional[str] = None
+
+# Функция для получения текущего пользователя на основе токена
+async def get_current_user(
+    token: HTTPAuthorizationCredentials = Depends(security),
+    supabase: AsyncClient = Depends(get_supabase),
+):
+    # Проверяем токен локально по кэшированным ключам JWKS, без запроса к Supabase
+    payload = await verify_supabase_jwt(token.credentials)
+    if payload is not None:
+        return CurrentUser(id=payload["sub"], email=payload.get("email"))
+    # Ключа для локальной проверки нет - ее выполняет Supabase. Просроченный токен он все равно
+    # отклонит, поэтому не тратим на него сетевой запрос: непроверенный exp здесь может
+    # только отклонить запрос, но не пропустить его
+    exp = decode_claims_unverified(token.credentials).get("exp")
+    if isinstance(exp, (int, float)) and exp <= time.time():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Срок действия токена истек."
+        )
+    cache_key = token_cache_key(token.credentials)
+    cached = _user_cache.get(cache_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    try:
+        user_resp = await supabase.auth.get_user(token.credentials)
+    except AuthApiError as exc:
+        # Сюда попадают и токены, которые не удалось проверить локально, поэтому
+        # отказ Supabase отдаем как 401, а не как необработанную ошибку
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=exc.message
+        )
+    if user_resp is None or user_resp.user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Ошибка получения данных пользователя."
+        )
+    expires_at = time.time() + USER_CACHE_TTL
+    if isinstance(exp, (int, float)):
+        expires_at = min(exp, expires_at)
+    _user_cache[cache_key] = (user_resp.user, expires_at)
+    return user_resp.user
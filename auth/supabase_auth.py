@@ -0,0 +1,262 @@
+"""
+Локальная проверка access token'ов Supabase.
+Публичные ключи проекта (JWKS) кэшируются в памяти процесса, чтобы не ходить в Supabase на каждый запрос.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+import jwt
+from cachetools import TTLCache
+from fastapi import HTTPException, status
+from jwt import PyJWK, PyJWTError
+
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Загрузка настроек из окружения
+settings = get_settings()
+SUPABASE_JWKS_URL = f"{settings.supabase_url}/auth/v1/.well-known/jwks.json"
+SUPABASE_JWT_SECRET = settings.supabase_jwt_secret
+
+JWKS_DEFAULT_TTL = 600  # Время жизни JWKS в секундах, если Supabase не прислал Cache-Control: max-age
+JWKS_RETRY_AFTER = 30  # Пауза в секундах перед повторной попыткой после неудачного обновления JWKS
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+# Общий асинхронный HTTP-клиент: запросы JWKS не блокируют event loop,
+# а keep-alive пул избавляет от нового TCP+TLS рукопожатия при каждом обновлении ключей
+_http = httpx.AsyncClient(
+    timeout=httpx.Timeout(3.0, connect=1.0),
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=4, keepalive_expiry=25),
+    http2=True,
+)
+
+# Асимметричные алгоритмы ключей подписи Supabase Auth, которые проверяются по JWKS
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+PAYLOAD_CACHE_SIZE = 4096
+PAYLOAD_CACHE_TTL = 3600  # Верхняя граница; запись в любом случае не переживает exp токена
+
+
+def _max_age(cache_control: Optional[str]) -> int:
+    # Достаем max-age из заголовка Cache-Control
+    match = _MAX_AGE_RE.search(cache_control or "")
+    return int(match.group(1)) if match else JWKS_DEFAULT_TTL
+
+
+def _index_keys(jwks_keys: list) -> Dict[str, PyJWK]:
+    # Ключи разбираются в объекты cryptography один раз при загрузке JWKS, а не на каждый запрос
+    keys_by_kid = {}
+    for key in jwks_keys:
+        if not isinstance(key, dict) or not isinstance(key.get("kid"), str):
+            continue
+        try:
+            keys_by_kid[key["kid"]] = PyJWK(key)
+        except PyJWTError as exc:
+            logger.warning("Пропущен ключ JWKS %s: %s", key["kid"], exc)
+    return keys_by_kid
+
+
+class _JwksCache:
+    """
+    Кэш JWKS одного URL: ключи проиндексированы по kid, по истечении срока
+    выполняется условный запрос с If-None-Match.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.keys_by_kid: Dict[str, PyJWK] = {}
+        self.etag: Optional[str] = None
+        self.expires_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def get(self) -> Dict[str, PyJWK]:
+        if time.monotonic() < self.expires_at:
+            return self.keys_by_kid
+        # Single-flight: все запросы, пришедшие во время обновления, ждут одну и ту же задачу,
+        # а не отправляют в Supabase собственные запросы. shield не дает отмене одного
+        # запроса (например, при разрыве соединения клиентом) прервать обновление для остальных
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh())
+            self._refreshing.add_done_callback(self._refresh_done)
+        await asyncio.shield(self._refreshing)
+        return self.keys_by_kid
+
+    def _refresh_done(self, _task: asyncio.Task):
+        self._refreshing = None
+
+    async def _refresh(self):
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        try:
+            response = await _http.get(self.url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+                body = response.json()
+                jwks_keys = body.get("keys", []) if isinstance(body, dict) else None
+                if not isinstance(jwks_keys, list):
+                    raise ValueError("JWKS body is not a key set")
+                self.keys_by_kid = _index_keys(jwks_keys)
+                self.etag = response.headers.get("ETag")
+        except (httpx.HTTPError, ValueError) as exc:
+            # При сетевой ошибке или некорректном ответе оставляем прежние ключи и не пытаемся
+            # снова JWKS_RETRY_AFTER секунд, чтобы при недоступном Supabase каждый запрос
+            # не ждал таймаута перед переходом к get_user
+            logger.warning("Не удалось получить JWKS Supabase: %s", exc)
+            self.expires_at = time.monotonic() + JWKS_RETRY_AFTER
+            return
+        self.expires_at = time.monotonic() + _max_age(response.headers.get("Cache-Control"))
+
+
+_jwks_cache = _JwksCache(SUPABASE_JWKS_URL)
+
+# Кэш проверенных payload'ов: BLAKE2b(token) -> (payload, exp).
+# Ключом служит хэш, чтобы сами bearer-токены не хранились в памяти процесса.
+_payload_cache = TTLCache(maxsize=PAYLOAD_CACHE_SIZE, ttl=PAYLOAD_CACHE_TTL)
+
+
+def token_cache_key(token: str) -> bytes:
+    """
+    Ключ для кэшей по токену: BLAKE2b вместо самого токена, чтобы не хранить bearer-токены в памяти.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+async def fetch_jwks() -> Dict[str, PyJWK]:
+    """
+    Возвращает публичные ключи Supabase в виде словаря {kid: PyJWK}.
+    """
+    return await _jwks_cache.get()
+
+
+async def close_http_client():
+    """
+    Закрывает HTTP-клиент запросов JWKS; вызывается при остановке приложения.
+    """
+    await _http.aclose()
+
+
+def _b64url_decode(segment: str) -> bytes:
+    # Сегменты JWT закодированы base64url без выравнивания; лишние "=" декодер игнорирует
+    return base64.urlsafe_b64decode(segment + "==")
+
+
+def _b64url_json(segment: str) -> dict:
+    value = json.loads(_b64url_decode(segment))
+    if not isinstance(value, dict):
+        raise ValueError("JWT segment is not an object")
+    return value
+
+
+def _unverified_header(token: str) -> dict:
+    # Разбираем только заголовок, чтобы выбрать ключ; подпись и claims проверяются дальше
+    return _b64url_json(token.split(".", 1)[0])
+
+
+def decode_claims_unverified(token: str) -> dict:
+    """
+    Возвращает claims токена БЕЗ проверки подписи (пустой словарь, если токен не разбирается).
+    Безопасно только для токенов, уже проверенных выше по стеку, либо для решений,
+    которые могут лишь отклонить запрос, но не пропустить его.
+    """
+    try:
+        return _b64url_json(token.split(".")[1])
+    except (IndexError, ValueError):
+        return {}
+
+
+def _verify_hs256(token: str) -> dict:
+    # HS256 - это HMAC-SHA256 от "header.payload", поэтому проверяем его напрямую через hmac,
+    # без общего конвейера jwt.decode
+    header_b64, payload_b64, signature_b64 = token.split(".")
+    expected = hmac.new(SUPABASE_JWT_SECRET.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+        raise ValueError("JWT signature mismatch")
+    payload = _b64url_json(payload_b64)
+    audience = payload.get("aud")
+    if isinstance(audience, str):
+        audience = [audience]
+    not_before = payload.get("nbf", 0)
+    now = time.time()
+    if (
+        not isinstance(payload.get("exp"), (int, float))
+        or payload["exp"] <= now
+        or not isinstance(not_before, (int, float))
+        or not_before > now
+        or "sub" not in payload
+        or not isinstance(audience, list)
+        or "authenticated" not in audience
+    ):
+        raise ValueError("JWT claims are invalid")
+    return payload
+
+
+async def verify_supabase_jwt(token: str) -> Optional[dict]:
+    """
+    Проверяет подпись и срок действия access token'а Supabase и возвращает его payload.
+    RS256/ES256-токены проверяются по JWKS, HS256 - по SUPABASE_JWT_SECRET.
+    Возвращает None, если подходящего ключа нет, - такой токен проверяет сам Supabase.
+    """
+    cache_key = token_cache_key(token)
+    cached = _payload_cache.get(cache_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    try:
+        header = _unverified_header(token)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Некорректный формат токена."
+        )
+    alg = header.get("alg")
+    # Неподписанные токены (alg=none) и HMAC-алгоритмы, кроме HS256, Supabase не выпускает -
+    # отклоняем их по заголовку, не доходя до поиска ключа и проверки подписи
+    if not isinstance(alg, str) or alg.lower() == "none" or (alg.startswith("HS") and alg != "HS256"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неподдерживаемый алгоритм подписи токена."
+        )
+    try:
+        if alg == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                return None
+            payload = _verify_hs256(token)
+        elif alg in ASYMMETRIC_ALGORITHMS:
+            kid = header.get("kid")
+            if not isinstance(kid, str):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Некорректный формат токена."
+                )
+            jwk = (await fetch_jwks()).get(kid)
+            if jwk is None:
+                return None
+            # Алгоритм берется из самого ключа: токен с чужим alg для этого kid не пройдет
+            if jwk.algorithm_name != alg:
+                raise ValueError("JWT alg does not match the signing key")
+            payload = jwt.decode(
+                token,
+                jwk.key,
+                algorithms=[jwk.algorithm_name],
+                audience="authenticated",
+                options={"require": ["exp", "sub"]},
+            )
+        else:
+            # Локально проверить такой токен нечем - проверку выполняет Supabase
+            return None
+    except (PyJWTError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Недействительный или просроченный токен."
+        )
+    _payload_cache[cache_key] = (payload, payload["exp"])
+    return payload
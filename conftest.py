@@ -0,0 +1,5 @@
+import os
+
+# Модули приложения читают настройки при импорте, поэтому тестовое окружение задается до сбора тестов
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
@@ -0,0 +1,101 @@
+"""
+Асинхронные клиенты Supabase, общие для всех маршрутов приложения.
+Создаются лениво при первом запросе и живут весь процесс; запросы к Auth и PostgREST
+идут через общий keep-alive пул соединений.
+"""
+
+import asyncio
+import logging
+from typing import Dict
+
+import httpx
+from gotrue.http_clients import AsyncClient as AuthHttpClient
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+
+from settings import get_settings
+
+# Загрузка настроек из окружения
+settings = get_settings()
+
+# httpx пишет в лог каждый запрос на уровне INFO; в продакшене эта строка на каждый
+# запрос к Supabase не нужна, поэтому включаем ее только явно через SUPABASE_HTTP_ECHO=1
+logging.getLogger("httpx").setLevel(logging.INFO if settings.supabase_http_echo else logging.WARNING)
+
+# Общий транспорт для всех запросов к Supabase (Auth и PostgREST): TLS-соединения
+# переиспользуются между клиентами и запросами вместо нового рукопожатия на каждый вызов.
+# Простаивающее соединение закрываем раньше, чем его закроет шлюз Supabase (~30 с),
+# чтобы не отправлять запрос в уже разорванное соединение
+_transport = httpx.AsyncHTTPTransport(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=25),
+)
+
+
+def _pooled_postgrest_client(*args, **kwargs):
+    # supabase-py пересоздает клиент PostgREST при смене сессии, поэтому подменяем
+    # его HTTP-сессию на каждом создании, сохраняя базовый URL и заголовки.
+    # Исходная сессия еще не открывала соединений, поэтому закрывать ее не нужно
+    postgrest = AsyncClient._init_postgrest_client(*args, **kwargs)
+    session = postgrest.session
+    postgrest.session = httpx.AsyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        transport=_transport,
+    )
+    return postgrest
+
+
+async def _create_client() -> AsyncClient:
+    options = AsyncClientOptions(
+        postgrest_client_timeout=5,
+        storage_client_timeout=5,
+        # На сервере сессия не хранится и не обновляется в фоне
+        auto_refresh_token=False,
+        persist_session=False,
+    )
+    client = await acreate_client(settings.supabase_url, settings.supabase_key, options=options)
+    client._init_postgrest_client = _pooled_postgrest_client
+    # Клиент Auth создается один раз вместе с клиентом Supabase, его HTTP-клиент заменяем сразу
+    await client.auth._http_client.aclose()
+    client.auth._http_client = AuthHttpClient(follow_redirects=True, transport=_transport)
+    return client
+
+
+_clients: Dict[str, AsyncClient] = {}
+_clients_lock = asyncio.Lock()
+
+
+async def _get_client(name: str) -> AsyncClient:
+    # Клиент создается при первом обращении и дальше переиспользуется всем процессом
+    if name not in _clients:
+        async with _clients_lock:
+            if name not in _clients:
+                _clients[name] = await _create_client()
+    return _clients[name]
+
+
+async def get_supabase() -> AsyncClient:
+    """
+    Клиент для работы с данными и проверки токенов.
+    """
+    return await _get_client("data")
+
+
+async def get_auth_client() -> AsyncClient:
+    """
+    Отдельный клиент для входа, регистрации и обновления сессии: эти вызовы меняют сессию
+    клиента, и она не должна попадать в заголовки запросов к данным.
+    """
+    return await _get_client("auth")
+
+
+async def close_clients():
+    """
+    Закрывает общий пул соединений Supabase; вызывается при остановке приложения.
+    """
+    # HTTP-клиенты Auth и PostgREST работают поверх _transport, поэтому его закрытие
+    # закрывает все их соединения
+    _clients.clear()
+    await _transport.aclose()
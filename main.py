@@ -3,22 +3,56 @@
 Использует FastAPI и Supabase для управления пользователями и сессиями.
 """
 
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from auth.supabase_auth import close_http_client, fetch_jwks
+from db.supabase_client import close_clients
+from settings import get_settings
 from routes import auth, appointments  # Импортируем маршруты для аутентификации и заявок
 
-app = FastAPI()
+# Загрузка настроек из окружения
+settings = get_settings()
+FRONTEND_ORIGINS = [origin.strip() for origin in settings.frontend_origin.split(",") if origin.strip()]
+LOG_LEVEL = settings.log_level
+
+# Настройка логирования: в продакшене по умолчанию только предупреждения и ошибки,
+# подробный журнал включается через LOG_LEVEL=INFO или DEBUG
+logging.basicConfig(level=LOG_LEVEL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ключи JWKS загружаются при старте, чтобы первый запрос не ждал обращения к Supabase
+    await fetch_jwks()
+    yield
+    # При остановке закрываем keep-alive соединения, чтобы перезапуск воркера
+    # не оставлял открытых HTTP/2-соединений к Supabase
+    await close_http_client()
+    await close_clients()
+
+# Ответы сериализуются через orjson
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Настройка CORS (Cross-Origin Resource Sharing)
 # Позволяет вашему приложению принимать запросы с других доменов
+# Явные списки методов и заголовков вместе с max_age позволяют браузеру кэшировать
+# preflight-ответы и не отправлять OPTIONS перед каждым запросом
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Разрешает запросы с любых доменов (измените на конкретные домены в продакшене)
+    allow_origins=FRONTEND_ORIGINS,  # Домены фронтенда через запятую в FRONTEND_ORIGIN (по умолчанию любые)
     allow_credentials=True,
-    allow_methods=["*"],  # Разрешает все HTTP методы (GET, POST, PUT, DELETE и т.д.)
-    allow_headers=["*"],  # Разрешает все заголовки
+    allow_methods=["GET", "POST", "DELETE"],  # Методы, которые используют маршруты приложения
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # Браузер кэширует preflight-ответ на сутки
 )
 
+# Сжатие ответов: списки заявок заметно уменьшаются при передаче, мелкие ответы не сжимаются
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Подключение маршрутов
 app.include_router(auth.router, prefix="/auth", tags=["auth"])  # Маршруты для аутентификации
 app.include_router(appointments.router, prefix="/api", tags=["appointments"])  # Маршруты для работы с заявками
@@ -7,22 +7,18 @@ import logging
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel
 from typing import List, Optional
-from supabase import create_client, Client
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import os
+from auth.dependencies import get_current_user
+from supabase import AsyncClient
+from db.supabase_client import get_supabase
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-
-# Загрузка переменных окружения
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Инициализация клиента Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Уровень и обработчики логирования настраиваются при запуске приложения (uvicorn / окружение)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-security = HTTPBearer()  # Используется для извлечения токена из заголовка Authorization
+
+# Колонки, которые отдаются клиенту, и ограничение на размер списка заявок
+APPOINTMENT_COLUMNS = "id,user_id,appointment_date,status,comments,created_at,updated_at"
+APPOINTMENTS_LIMIT = 200
 
 # Модель данных для заявки
 class Appointment(BaseModel):
@@ -30,7 +26,7 @@ class Appointment(BaseModel):
     user_id: str
     appointment_date: str
     status: str
-    comments: Optional[str]
+    comments: Optional[str] = None
     created_at: str
     updated_at: str
 
@@ -39,49 +35,49 @@ class AppointmentCreate(BaseModel):
     appointment_date: str
     comments: Optional[str] = None
 
-# Функция для получения текущего пользователя на основе токена
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
-    user_resp = supabase.auth.get_user(token.credentials)
-    if user_resp.user is None:
-        error_message = user_resp.error.message if user_resp.error else "Ошибка получения данных пользователя."
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=error_message
-        )
-    return user_resp.user
-
-@router.get("/appointments", response_model=List[Appointment])
-async def get_appointments(user=Depends(get_current_user)):
+# Список выбирается из Supabase только по колонкам APPOINTMENT_COLUMNS, поэтому повторно
+# через response_model его не валидируем; модель указана только для схемы OpenAPI
+@router.get("/appointments", responses={200: {"model": List[Appointment]}})
+async def get_appointments(user=Depends(get_current_user), supabase: AsyncClient = Depends(get_supabase)):
     """
     Возвращает список заявок для текущего пользователя.
     """
-    logging.info(f"Получение заявок для пользователя: {user.id}")
-    response = supabase.from_("appointments").select("*").eq("user_id", user.id).execute()
-    logging.info(f"Ответ от Supabase: {response}")
-    if not response.data:
+    logger.info("Получение заявок для пользователя: %s", user.id)
+    query = (
+        supabase.from_("appointments")
+        .select(APPOINTMENT_COLUMNS)
+        .eq("user_id", user.id)
+        .order("appointment_date", desc=True)
+        .limit(APPOINTMENTS_LIMIT)
+    )
+    response = await query.execute()
+    logger.info("Ответ от Supabase: строк=%d", len(response.data or []))
+    # Пустой список - не ошибка: у пользователя просто еще нет заявок
+    if response.data is None:
         error_message = "Ошибка при получении заявок."
-        logging.error(error_message)
+        logger.error(error_message)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_message
         )
     return response.data
 
+# Вставка возвращает строку целиком, поэтому response_model здесь остается для фильтрации колонок
 @router.post("/appointments", response_model=Appointment)
-async def create_appointment(appointment: AppointmentCreate, user=Depends(get_current_user)):
+async def create_appointment(appointment: AppointmentCreate, user=Depends(get_current_user), supabase: AsyncClient = Depends(get_supabase)):
     """
     Создает новую заявку для текущего пользователя.
     """
-    logging.info(f"Создание заявки для пользователя: {user.id} на дату: {appointment.appointment_date}")
-    response = supabase.from_("appointments").insert({
+    logger.info("Создание заявки для пользователя: %s на дату: %s", user.id, appointment.appointment_date)
+    response = await supabase.from_("appointments").insert({
         "user_id": user.id,
         "appointment_date": appointment.appointment_date,
         "comments": appointment.comments
     }).execute()
-    logging.info(f"Ответ от Supabase: {response}")
+    logger.info("Ответ от Supabase: строк=%d", len(response.data or []))
     if not response.data:
         error_message = "Дата уже занята" if "unique constraint" in response.error.message else "Ошибка при создании заявки."
-        logging.error(error_message)
+        logger.error(error_message)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT if "unique constraint" in response.error.message else status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_message
@@ -89,30 +85,20 @@ async def create_appointment(appointment: AppointmentCreate, user=Depends(get_cu
     return response.data[0]
 
 @router.delete("/appointments/{id}")
-async def delete_appointment(id: int, user=Depends(get_current_user)):
+async def delete_appointment(id: int, user=Depends(get_current_user), supabase: AsyncClient = Depends(get_supabase)):
     """
     Удаляет заявку по ID для текущего пользователя.
     """
-    logging.info(f"Удаление заявки с ID: {id} для пользователя: {user.id}")
-    # Проверяем, существует ли заявка и принадлежит ли она текущему пользователю
-    response = supabase.from_("appointments").select("*").eq("id", id).eq("user_id", user.id).execute()
-    logging.info(f"Ответ от Supabase: {response}")
+    logger.info("Удаление заявки с ID: %s для пользователя: %s", id, user.id)
+    # Удаляем заявку одним запросом: фильтр по user_id проверяет владельца,
+    # а PostgREST возвращает удаленные строки (RETURNING)
+    response = await supabase.from_("appointments").delete().eq("id", id).eq("user_id", user.id).execute()
+    logger.info("Ответ от Supabase при удалении: строк=%d", len(response.data or []))
     if not response.data:
         error_message = "Заявка не найдена."
-        logging.error(error_message)
+        logger.error(error_message)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=error_message
         )
-    
-    # Удаляем заявку
-    delete_response = supabase.from_("appointments").delete().eq("id", id).execute()
-    logging.info(f"Ответ от Supabase при удалении: {delete_response}")
-    if not delete_response.data:
-        error_message = "Ошибка при удалении заявки."
-        logging.error(error_message)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=error_message
-        )
     return {"success": True, "message": "Заявка успешно отменена."} 
\ No newline at end of file
@@ -3,30 +3,51 @@
 Использует Supabase для управления пользователями и сессиями.
 """
 
-from fastapi import APIRouter, HTTPException, status, Request
-from pydantic import BaseModel, EmailStr
-from supabase import create_client, Client
-import os
+import hashlib
+import re
+from typing import Annotated
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import AfterValidator, BaseModel, StringConstraints
+from supabase import AsyncClient, AuthApiError
+from db.supabase_client import get_auth_client
 
-# Загрузка переменных окружения
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+router = APIRouter()
 
-# Инициализация клиента Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Формат email проверяется одним заранее скомпилированным выражением,
+# без email-validator; полную проверку адреса выполняет Supabase Auth
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
 
-router = APIRouter()
+def _fast_email_check(value: str) -> str:
+    if not _EMAIL_RE.fullmatch(value):
+        raise ValueError("Некорректный email.")
+    return value
+
+# Пробелы по краям срезает pydantic-core до проверки формата; пароль при этом не трогаем
+Email = Annotated[str, StringConstraints(strip_whitespace=True), AfterValidator(_fast_email_check)]
 
 class UserIn(BaseModel):
-    email: EmailStr
+    email: Email
     password: str
 
+# Недавно отклоненные пары email/пароль: повторную попытку с теми же данными отклоняем сразу,
+# не нагружая Supabase Auth (и bcrypt на его стороне) подбором паролей
+FAILED_LOGIN_TTL = 30
+_failed_logins = TTLCache(maxsize=10_000, ttl=FAILED_LOGIN_TTL)
+# Один и тот же ответ из кэша и от Supabase, чтобы по нему нельзя было понять, сработал ли кэш
+INVALID_CREDENTIALS_DETAIL = "Неверный email или пароль."
+
+def _login_key(email: str, password: str) -> bytes:
+    # В кэше хранится только хэш, а не сами учетные данные
+    return hashlib.blake2b(f"{email}\0{password}".encode(), digest_size=16).digest()
+
 @router.post("/register")
-async def register(user: UserIn):
+async def register(user: UserIn, supabase: AsyncClient = Depends(get_auth_client)):
     """
     Регистрация нового пользователя через Supabase Auth.
     """
-    response = supabase.auth.sign_up({
+    response = await supabase.auth.sign_up({
         "email": user.email,
         "password": user.password
     })
@@ -43,14 +64,35 @@ async def register(user: UserIn):
     }
 
 @router.post("/login")
-async def login(user: UserIn):
+async def login(user: UserIn, supabase: AsyncClient = Depends(get_auth_client)):
     """
     Аутентификация пользователя и выдача access и refresh токенов через Supabase.
     """
-    response = supabase.auth.sign_in_with_password({
-        "email": user.email,
-        "password": user.password
-    })
+    login_key = _login_key(user.email, user.password)
+    if login_key in _failed_logins:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=INVALID_CREDENTIALS_DETAIL
+        )
+    try:
+        response = await supabase.auth.sign_in_with_password({
+            "email": user.email,
+            "password": user.password
+        })
+    except AuthApiError as exc:
+        # Запоминаем только неверные учетные данные: неподтвержденный email, ошибки валидации,
+        # лимиты и сбои Supabase могут пройти при повторной попытке, поэтому их статус
+        # передаем клиенту как есть
+        if exc.code == "invalid_credentials":
+            _failed_logins[login_key] = True
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=INVALID_CREDENTIALS_DETAIL
+            )
+        raise HTTPException(
+            status_code=exc.status,
+            detail=exc.message
+        )
     if response.session is None:
         error_message = response.error.message if response.error else "Ошибка аутентификации."
         raise HTTPException(
@@ -58,14 +100,15 @@ async def login(user: UserIn):
             detail=error_message
         )
     session = response.session
-    return {
+    # Ответ собирается вручную и сразу отдается в orjson, минуя обход jsonable_encoder
+    return ORJSONResponse({
         "access_token": session.access_token,
         "refresh_token": session.refresh_token,
-        "user": response.user
-    }
+        "user": response.user.model_dump(mode="json")
+    })
 
 @router.post("/refresh")
-async def refresh_token(request: Request):
+async def refresh_token(request: Request, supabase: AsyncClient = Depends(get_auth_client)):
     """
     Обновляет access token, используя refresh token, который передается в теле запроса.
     """
@@ -76,7 +119,7 @@ async def refresh_token(request: Request):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token отсутствует."
         )
-    refresh_resp = supabase.auth.refresh_session({"refresh_token": refresh_token_val})
+    refresh_resp = await supabase.auth.refresh_session({"refresh_token": refresh_token_val})
     if refresh_resp.session is None:
         error_message = refresh_resp.error.message if refresh_resp.error else "Не удалось обновить сессию."
         raise HTTPException(
@@ -84,4 +127,4 @@ async def refresh_token(request: Request):
             detail=error_message
         )
     session = refresh_resp.session
-    return {"access_token": session.access_token} 
\ No newline at end of file
+    return ORJSONResponse({"access_token": session.access_token}) 
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Настройки приложения из переменных окружения (и файла .env).
+Читаются и валидируются один раз при импорте модулей приложения; кэш get_settings
+лишь избавляет от повторного разбора окружения.
+"""
+
+from functools import lru_cache
+from typing import Literal, Optional
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore", frozen=True)
+
+    supabase_url: str
+    supabase_key: str
+    supabase_jwt_secret: Optional[str] = None  # Общий HS256-секрет проекта, если токены подписаны им
+    supabase_http_echo: bool = False  # Логировать каждый HTTP-запрос к Supabase
+    frontend_origin: str = "*"  # Разрешенные для CORS домены фронтенда через запятую
+    log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "WARNING"
+
+    @field_validator("log_level", mode="before")
+    @classmethod
+    def _normalize_log_level(cls, value):
+        # LOG_LEVEL=info и LOG_LEVEL=INFO равнозначны
+        return value.upper() if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
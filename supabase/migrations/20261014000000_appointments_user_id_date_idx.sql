@@ -0,0 +1,4 @@
+-- Индекс под выборку заявок пользователя (GET /api/appointments):
+-- фильтр по user_id и сортировка по appointment_date DESC обслуживаются одним индексом.
+create index if not exists appointments_user_id_date_idx
+    on public.appointments (user_id, appointment_date desc);
@@ -0,0 +1,110 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from auth import supabase_auth
+
+SECRET = "test-secret"
+
+
+@pytest.fixture(autouse=True)
+def jwt_secret(monkeypatch):
+    monkeypatch.setattr(supabase_auth, "SUPABASE_JWT_SECRET", SECRET)
+    supabase_auth._payload_cache.clear()
+
+
+def make_token(secret=SECRET, **claims):
+    payload = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 60}
+    payload.update(claims)
+    return jwt.encode({key: value for key, value in payload.items() if value is not None}, secret, algorithm="HS256")
+
+
+def test_valid_token():
+    payload = supabase_auth._verify_hs256(make_token(email="a@example.com"))
+    assert payload["sub"] == "user-1"
+    assert payload["email"] == "a@example.com"
+
+
+def test_audience_list():
+    assert supabase_auth._verify_hs256(make_token(aud=["authenticated", "other"]))["sub"] == "user-1"
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        make_token(secret="other-secret"),
+        make_token(exp=int(time.time()) - 1),
+        make_token(exp=None),
+        make_token(nbf=int(time.time()) + 60),
+        make_token(nbf="soon"),
+        make_token(aud="anon"),
+        make_token(aud=None),
+        make_token(sub=None),
+    ],
+    ids=["bad-signature", "expired", "no-exp", "nbf-in-future", "nbf-not-number", "wrong-aud", "no-aud", "no-sub"],
+)
+def test_rejected_token(token):
+    with pytest.raises(ValueError):
+        supabase_auth._verify_hs256(token)
+
+
+def test_past_nbf_is_accepted():
+    assert supabase_auth._verify_hs256(make_token(nbf=int(time.time()) - 60))["sub"] == "user-1"
+
+
+@pytest.mark.parametrize(
+    "token",
+    ["abc", "a.b", "a.b.c.d", "!!!.e30.c2ln", make_token().rsplit(".", 1)[0] + ".%%%"],
+    ids=["one-segment", "two-segments", "four-segments", "bad-base64", "bad-signature-segment"],
+)
+def test_malformed_segments(token):
+    with pytest.raises(ValueError):
+        supabase_auth._verify_hs256(token)
+
+
+def test_payload_not_object():
+    header_b64, _, _ = make_token().split(".")
+    body = supabase_auth.base64.urlsafe_b64encode(b"[1]").rstrip(b"=").decode()
+    token_body = f"{header_b64}.{body}"
+    signature = supabase_auth.hmac.new(SECRET.encode(), token_body.encode(), supabase_auth.hashlib.sha256).digest()
+    token = f"{token_body}.{supabase_auth.base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+    with pytest.raises(ValueError):
+        supabase_auth._verify_hs256(token)
+
+
+@pytest.mark.asyncio
+async def test_verify_supabase_jwt_hs256():
+    payload = await supabase_auth.verify_supabase_jwt(make_token())
+    assert payload["sub"] == "user-1"
+
+
+@pytest.mark.asyncio
+async def test_verify_supabase_jwt_rejects_nbf_with_401():
+    with pytest.raises(HTTPException) as exc_info:
+        await supabase_auth.verify_supabase_jwt(make_token(nbf=int(time.time()) + 60))
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_verify_supabase_jwt_without_secret_defers_to_supabase(monkeypatch):
+    monkeypatch.setattr(supabase_auth, "SUPABASE_JWT_SECRET", None)
+    assert await supabase_auth.verify_supabase_jwt(make_token()) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [[], {"keys": [1]}, {"keys": {"kid": "k1"}}, {"keys": [{"kid": ["k1"], "kty": "RSA"}]}])
+async def test_malformed_jwks_body_backs_off(monkeypatch, body):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return supabase_auth.httpx.Response(200, json=body)
+
+    monkeypatch.setattr(supabase_auth, "_http", supabase_auth.httpx.AsyncClient(transport=supabase_auth.httpx.MockTransport(handler)))
+    cache = supabase_auth._JwksCache("https://example.supabase.co/auth/v1/.well-known/jwks.json")
+    assert await cache.get() == {}
+    assert await cache.get() == {}
+    assert len(requests) == 1
+    assert cache.expires_at > time.monotonic()